@@ -12,15 +12,18 @@ from astrbot.core.star.context import Context
 class ConfigNode:
     """配置节点：dict → 强类型属性访问（极简版）"""
 
-    _SCHEMA_CACHE: dict[type, dict[str, type]] = {}
+    # 子类定义时一次性解析出的字段名集合
+    _SCHEMA: frozenset[str] = frozenset()
 
-    @classmethod
-    def _schema(cls) -> dict[str, type]:
-        return cls._SCHEMA_CACHE.setdefault(cls, get_type_hints(cls))
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._SCHEMA = frozenset(
+            key for key in get_type_hints(cls) if not key.startswith("_")
+        )
 
     def __init__(self, data: MutableMapping[str, Any]):
         object.__setattr__(self, "_data", data)
-        for key in self._schema():
+        for key in self._SCHEMA:
             if key in data:
                 continue
             if hasattr(self.__class__, key):
@@ -28,12 +31,12 @@ class ConfigNode:
             logger.warning(f"[config:{self.__class__.__name__}] 缺少字段: {key}")
 
     def __getattr__(self, key: str) -> Any:
-        if key in self._schema():
+        if key in type(self)._SCHEMA:
             return self._data.get(key)
         raise AttributeError(key)
 
     def __setattr__(self, key: str, value: Any) -> None:
-        if key in self._schema():
+        if key in type(self)._SCHEMA:
             self._data[key] = value
             return
         object.__setattr__(self, key, value)
@@ -43,22 +46,40 @@ class ConfigNode:
 
 
 class PluginConfig(ConfigNode):
+    """
+    插件配置：初始化后只读
+    （热路径字段与派生集合均在初始化时快照，配置变更由 AstrBot 重载插件生效）
+    """
+
     group_whitelist: list[str]
     need_different: bool
     thresholds: dict[str, int]
     reread_prob: float
     interrupt_prob: float
+    max_groups: int
+
+    # 热路径字段：快照为普通实例属性，读取时不再经过 __getattr__
+    _HOT_FIELDS = (
+        "group_whitelist",
+        "need_different",
+        "thresholds",
+        "reread_prob",
+        "interrupt_prob",
+    )
 
     def __init__(self, cfg: AstrBotConfig, context: Context):
         super().__init__(cfg)
+        for key in self._HOT_FIELDS:
+            object.__setattr__(self, key, cfg.get(key))
         self.context = context
-        self.supported_type = list(self.thresholds.keys())
+        self.supported_type = frozenset(self.thresholds.keys())
+        self.group_whitelist_set = frozenset(self.group_whitelist)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        # 写入配置字段会与快照不一致，直接拒绝
+        if key in type(self)._SCHEMA:
+            raise AttributeError(f"[config:PluginConfig] 配置只读: {key}")
+        object.__setattr__(self, key, value)
 
     def get_threshold(self, seg_type: str) -> int:
         return self.thresholds.get(seg_type, 0)
-
-    def is_supported_type(self, seg_type: str) -> bool:
-        return seg_type in self.supported_type
-
-    def is_white_group(self, group_id: str) -> bool:
-        return group_id in self.group_whitelist
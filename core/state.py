@@ -1,118 +1,147 @@
-import asyncio
-from collections import deque
-from typing import TypedDict
+from collections import OrderedDict
 
+# 消息逻辑指纹：(类别, 内容键)
+Fingerprint = tuple[str, str]
 
-class MsgRecord(TypedDict):
+# 未配置 max_groups 时的默认群状态缓存上限
+DEFAULT_MAX_GROUPS = 4096
+
+
+class TypeWindow:
     """
-    单条复读窗口记录（仅用于判定）
+    单个消息类型的判定状态
+    - 最后一条消息的发送者与指纹
+    - 当前连续相同指纹的条数（streak）
     """
 
-    send_id: str
-    fp: str
+    __slots__ = ("fp", "send_id", "streak")
+
+    def __init__(self) -> None:
+        self.send_id: str | None = None
+        self.fp: Fingerprint | None = None
+        self.streak = 0
 
 
 class GroupState:
     """
-    单群状态容器
-    - 按消息类型分组的消息窗口（deque + maxlen）
+    单群状态容器（仅在事件循环内同步访问，无需加锁）
+    - 按消息类型记录连续相同指纹的条数（streak）
     - 最近一次成功复读的消息指纹（用于幂等保护）
     """
 
-    def __init__(self, thresholds: dict[str, int]):
-        # 群级并发保护
-        self.lock = asyncio.Lock()
-
-        # {seg_type: deque[MsgRecord]}
-        self.messages: dict[str, deque[MsgRecord]] = {
-            seg_type: deque(maxlen=limit) for seg_type, limit in thresholds.items()
+    def __init__(self, seg_types: tuple[str, ...]):
+        # {seg_type: TypeWindow}，热路径每条消息只查一次
+        self.windows: dict[str, TypeWindow] = {
+            seg_type: TypeWindow() for seg_type in seg_types
         }
+        # 同一批窗口的元组视图，供 clear_all 平铺遍历
+        self._window_seq: tuple[TypeWindow, ...] = tuple(self.windows.values())
 
         # 最近一次成功复读的内容指纹
-        self.last_repeated_fingerprint: str | None = None
+        self.last_repeated_fingerprint: Fingerprint | None = None
 
     # ───────── 窗口维护 ─────────
 
-    def clear_if_same_sender(
+    def observe(
         self,
         seg_type: str,
         send_id: str,
-        need_different: bool,
-    ) -> None:
+        fp: Fingerprint,
+    ) -> int:
         """
-        若要求必须不同人复读：
-        - 当前消息发送者与窗口中最后一条相同 → 清空窗口
+        记录一条消息并返回当前连续相同指纹的条数
+        - 与上一条指纹相同 → 计数 +1
+        - 否则 → 计数重置为 1
         """
-        if not need_different:
-            return
-
-        lst = self.messages[seg_type]
-        if lst and lst[-1]["send_id"] == send_id:
-            lst.clear()
-
-    def push_message(
+        w = self.windows[seg_type]
+        streak = w.streak + 1 if w.streak and w.fp == fp else 1
+        w.send_id = send_id
+        w.fp = fp
+        w.streak = streak
+        return streak
+
+    def observe_distinct(
         self,
         seg_type: str,
         send_id: str,
-        fp: str,
-    ) -> None:
-        """
-        将单段消息指纹压入对应类型的窗口
+        fp: Fingerprint,
+    ) -> int:
         """
-        self.messages[seg_type].append(
-            {
-                "send_id": send_id,
-                "fp": fp,
-            }
-        )
-
-    def get_messages(self, seg_type: str) -> deque[MsgRecord]:
+        同 observe，但要求必须不同人复读：
+        - 与上一条发送者相同 → 计数重置为 1
         """
-        获取指定消息类型的窗口
-        """
-        return self.messages[seg_type]
+        w = self.windows[seg_type]
+        if w.streak and w.fp == fp and w.send_id != send_id:
+            streak = w.streak + 1
+        else:
+            streak = 1
+        w.send_id = send_id
+        w.fp = fp
+        w.streak = streak
+        return streak
 
     def clear_all(self) -> None:
         """
-        清空当前群内所有消息窗口
+        重置当前群内所有类型的计数
         （通常在一次成功复读后调用）
         """
-        for lst in self.messages.values():
-            lst.clear()
+        for w in self._window_seq:
+            w.streak = 0
 
     # ───────── 幂等保护 ─────────
 
-    def is_same_as_last_repeat(self, fingerprint: str) -> bool:
+    def is_same_as_last_repeat(self, fingerprint: Fingerprint) -> bool:
         """
         判断当前候选复读内容
         是否与上一次成功复读的内容完全一致
         """
         return self.last_repeated_fingerprint == fingerprint
 
-    def mark_repeated(self, fingerprint: str) -> None:
+    def mark_repeated(self, fingerprint: Fingerprint) -> None:
         """
         标记一次成功复读：
         - 记录指纹
-        - 清空所有窗口，避免立刻二次触发
+        - 重置所有计数，避免立刻二次触发
         """
         self.last_repeated_fingerprint = fingerprint
         self.clear_all()
 
+    def reset(self) -> None:
+        """
+        恢复为初始状态（供淘汰后复用）
+        """
+        self.clear_all()
+        self.last_repeated_fingerprint = None
+
 
 class StateManager:
     """
     全局状态管理器（按群）
+    - 以 LRU 方式保留最多 max_groups 个群的状态
     """
 
-    _group_states: dict[str, GroupState] = {}
-
-    def __init__(self, thresholds: dict[str, int]):
-        self.thresholds = thresholds
+    def __init__(self, thresholds: dict[str, int], max_groups: int | None = None):
+        # 预先固化消息类型，新建 GroupState 时无需再遍历 dict
+        self._seg_types: tuple[str, ...] = tuple(thresholds)
+        # 旧配置可能缺少 max_groups（读取为 None），此时回退到默认值
+        self.max_groups = max(1, max_groups or DEFAULT_MAX_GROUPS)
+        # 按活跃度排序，队首为最久未活跃的群
+        self._group_states: OrderedDict[str, GroupState] = OrderedDict()
 
     def get_state(self, gid: str) -> GroupState:
         """
         获取或初始化指定群的状态对象
         """
-        if gid not in self._group_states:
-            self._group_states[gid] = GroupState(self.thresholds)
-        return self._group_states[gid]
+        state = self._group_states.get(gid)
+        if state is not None:
+            self._group_states.move_to_end(gid)
+            return state
+
+        if len(self._group_states) >= self.max_groups:
+            # 淘汰最久未活跃的群，直接复用其状态对象（无需额外对象池）
+            _, state = self._group_states.popitem(last=False)
+        else:
+            state = GroupState(self._seg_types)
+        state.reset()
+        self._group_states[gid] = state
+        return state
@@ -1,4 +1,7 @@
-import random
+import sys
+from collections.abc import Callable
+from random import random as _rand
+from typing import Any
 
 from astrbot.api.event import filter
 from astrbot.api.star import Context, Star
@@ -13,101 +16,162 @@ from astrbot.core.platform import AstrMessageEvent
 from astrbot.core.star.filter.event_message_type import EventMessageType
 
 from .core.config import PluginConfig
-from .core.state import StateManager
+from .core.state import Fingerprint, GroupState, StateManager
+
+# {seg.type: 类型名}，避免每条消息都 str() + split()
+_TYPE_NAME_CACHE: dict[object, str] = {}
+
+# 超过该长度的文本不做驻留，避免长期持有大字符串
+_INTERN_MAX_LEN = 128
+
+# 前置过滤通过后的候选消息：(group_id, send_id, seg_type, seg)
+_Candidate = tuple[str, str, str, BaseMessageComponent]
+
+# ───────── 指纹函数（按消息段类分派） ─────────
+
+
+def _fp_plain(seg: Plain) -> Fingerprint:
+    text = seg.text
+    if len(text) <= _INTERN_MAX_LEN:
+        text = sys.intern(text)
+    return ("text", text)
+
+
+def _fp_image(seg: Image) -> Fingerprint:
+    return ("image", sys.intern(seg.file or seg.url or seg.path or ""))
+
+
+def _fp_face(seg: Face) -> Fingerprint:
+    return ("face", sys.intern(str(seg.id)))
+
+
+def _fp_unknown(seg: BaseMessageComponent) -> Fingerprint:
+    return ("unknown", str(seg.type))
+
+
+# {消息段类: 指纹函数}，子类首次出现时经 isinstance 解析后写入
+_FP_DISPATCH: dict[type, Callable[[Any], Fingerprint]] = {
+    Plain: _fp_plain,
+    Image: _fp_image,
+    Face: _fp_face,
+}
+
+
+def _resolve_fp_handler(cls: type) -> Callable[[Any], Fingerprint]:
+    """
+    为未登记的消息段类解析指纹函数并缓存
+    """
+    for base in (Plain, Image, Face):
+        if issubclass(cls, base):
+            handler = _FP_DISPATCH[base]
+            break
+    else:
+        handler = _fp_unknown
+    _FP_DISPATCH[cls] = handler
+    return handler
 
 
 class RereadPlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.cfg = PluginConfig(config, context)
-        self.state_mgr = StateManager(self.cfg.thresholds)
+        self.state_mgr = StateManager(self.cfg.thresholds, self.cfg.max_groups)
+        # need_different 在插件生命周期内不变，初始化时选定计数实现
+        self._observe = (
+            GroupState.observe_distinct
+            if self.cfg.need_different
+            else GroupState.observe
+        )
+        self._should_consider = self._build_filter()
 
     # ───────── 指纹生成 ─────────
 
     @staticmethod
-    def make_fingerprint(seg: BaseMessageComponent) -> str:
+    def make_fingerprint(seg: BaseMessageComponent) -> Fingerprint:
         """
-        为单段消息生成稳定的逻辑指纹
+        为单段消息生成稳定的逻辑指纹（仅用于比较，不做展示）
         """
-        if isinstance(seg, Plain):
-            return f"text:{seg.text}"
+        handler = _FP_DISPATCH.get(type(seg))
+        if handler is None:
+            handler = _resolve_fp_handler(type(seg))
+        return handler(seg)
 
-        if isinstance(seg, Image):
-            key = seg.file or seg.url or seg.path
-            return f"image:{key}"
+    # ───────── 前置过滤 ─────────
 
-        if isinstance(seg, Face):
-            return f"face:{seg.id}"
+    def _build_filter(self) -> Callable[[AstrMessageEvent], _Candidate | None]:
+        """
+        构建前置过滤闭包：把热路径用到的配置固化为闭包变量，
+        通过则返回候选消息，否则返回 None
+        """
+        supported = self.cfg.supported_type
+        whitelist = self.cfg.group_whitelist_set
+        type_names = _TYPE_NAME_CACHE
+        intern = sys.intern
 
-        return f"unknown:{seg.type}"
+        def should_consider(event: AstrMessageEvent) -> _Candidate | None:
+            # at / 唤醒指令不处理
+            if event.is_at_or_wake_command:
+                return None
 
-    # ───────── 主处理逻辑 ─────────
+            chain = event.get_messages()
+            if len(chain) != 1:
+                return None
 
-    @filter.event_message_type(EventMessageType.GROUP_MESSAGE)
-    async def reread_handle(self, event: AstrMessageEvent):
-        # at / 唤醒指令不处理
-        if event.is_at_or_wake_command:
-            return
+            seg = chain[0]
+            seg_type = type_names.get(seg.type)
+            if seg_type is None:
+                seg_type = type_names.setdefault(seg.type, str(seg.type).split(".")[-1])
+            if seg_type not in supported:
+                return None
 
-        chain = event.get_messages()
-        if len(chain) != 1:
-            return
+            # 白名单（留空表示全部群聊启用）
+            group_id = intern(event.get_group_id())
+            if whitelist and group_id not in whitelist:
+                return None
 
-        seg = chain[0]
-        seg_type = str(seg.type).split(".")[-1]
+            # 廉价过滤全部通过后再取发送者
+            return group_id, intern(event.get_sender_id()), seg_type, seg
 
-        if not self.cfg.is_supported_type(seg_type):
-            return
+        return should_consider
 
-        group_id = event.get_group_id()
-        send_id = event.get_sender_id()
+    # ───────── 主处理逻辑 ─────────
 
-        if self.cfg.group_whitelist and not self.cfg.is_white_group(group_id):
+    @filter.event_message_type(EventMessageType.GROUP_MESSAGE)
+    async def reread_handle(self, event: AstrMessageEvent):
+        candidate = self._should_consider(event)
+        if candidate is None:
             return
+        group_id, send_id, seg_type, seg = candidate
 
         state = self.state_mgr.get_state(group_id)
 
-        # ========== 进入临界区 ==========
-        async with state.lock:
-            # 同人清窗
-            state.clear_if_same_sender(
-                seg_type,
-                send_id,
-                self.cfg.need_different,
-            )
-
-            # 生成指纹（只算一次）
-            fp = self.make_fingerprint(seg)
+        # 生成指纹（只算一次）
+        fp = self.make_fingerprint(seg)
 
-            # 推进窗口（只存判定信息）
-            state.push_message(seg_type, send_id, fp)
-            msg_list = state.get_messages(seg_type)
+        # ========== 状态判定 ==========
+        # 以下直到 event.send 前均为同步代码，不含 await，
+        # 单事件循环内不会被其他协程打断，因此无需群级锁。
+        # 若将来需在此区间内 await，须为该路径重新引入 asyncio.Lock。
 
-            threshold = self.cfg.get_threshold(seg_type)
-            if len(msg_list) < threshold:
-                return
-
-            # ───── 复读一致性判定 ─────
-            first_fp = msg_list[0]["fp"]
-            if any(m["fp"] != first_fp for m in msg_list):
-                return
+        # 推进计数（连续相同指纹即视为复读链，同人连发则重新计数）
+        streak = self._observe(state, seg_type, send_id, fp)
+        if streak < self.cfg.get_threshold(seg_type):
+            return
 
-            # 幂等保护
-            if state.is_same_as_last_repeat(first_fp):
-                return
+        # 幂等保护
+        if state.is_same_as_last_repeat(fp):
+            return
 
-            # 概率判定
-            if random.random() >= self.cfg.reread_prob:
-                return
+        # 概率判定
+        if _rand() >= self.cfg.reread_prob:
+            return
 
-            # ───── commit 点（不可回滚） ─────
-            state.mark_repeated(first_fp)
+        # ───── commit 点（不可回滚） ─────
+        state.mark_repeated(fp)
 
-            # ───── 输出准备（直接使用当下 seg） ─────
-            out_seg = (
-                Plain("打断！") if random.random() < self.cfg.interrupt_prob else seg
-            )
+        # ───── 输出准备（直接使用当下 seg） ─────
+        out_seg = Plain("打断！") if _rand() < self.cfg.interrupt_prob else seg
 
-        # ========== 出锁，执行 IO ==========
+        # ========== 执行 IO ==========
         await event.send(event.chain_result([out_seg]))
         event.stop_event()